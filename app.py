@@ -5,24 +5,46 @@ Keys are loaded via load_dotenv; do not hardcode API keys.
 """
 
 import asyncio
+import functools
 import os
-from datetime import datetime
+import re
+import threading
+from collections import deque
+from datetime import date, datetime
 from pathlib import Path
 
+import numpy as np
 import streamlit as st
 from dotenv import load_dotenv
 
 from utils import (
     GOAL_CATEGORIES,
+    GOAL_CATEGORIES_SET,
+    WEEKS_PER_YEAR,
     calculate_monthly_savings,
     goal_eta,
+    goal_eta_batch,
+    paper_cut_result,
     paper_cut_yearly_impact,
 )
 
-# Load .env from the app's directory first, then cwd as fallback (so key is always found).
 _app_dir = Path(__file__).resolve().parent
-load_dotenv(_app_dir / ".env")
-load_dotenv()
+
+
+@st.cache_resource(show_spinner=False)
+def _load_env_once() -> bool:
+    """Load .env from the app's directory first, then cwd as fallback; once per process, not per rerun."""
+    load_dotenv(_app_dir / ".env")
+    load_dotenv()
+    return True
+
+
+_load_env_once()
+
+
+# Shared currency formatters for metrics, tables and the AI context
+_USD = "${:,.2f}".format
+_INT_USD = "${:,.0f}".format
 
 
 # ---------------------------------------------------------------------------
@@ -35,8 +57,10 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
+# Chat history is a ring buffer: only the last MAX_CHAT_MESSAGES messages are kept and re-rendered.
+MAX_CHAT_MESSAGES = 50
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = deque(maxlen=MAX_CHAT_MESSAGES)
 if "income" not in st.session_state:
     st.session_state.income = 0.0
 if "expenses" not in st.session_state:
@@ -50,149 +74,414 @@ if "open_dialog" not in st.session_state:
     st.session_state.open_dialog = None
 
 
+# ---------------------------------------------------------------------------
+# Cached wrappers around the utils math (pure functions of their inputs)
+# ---------------------------------------------------------------------------
+# Shared bounds for the st.cache_data wrappers below (not the single-entry API key lookup,
+# which "Verify Dedalus key" clears explicitly); check actual sizes with ?debug=1.
+CACHE_TTL_S = 24 * 60 * 60
+CACHE_MAX_ENTRIES = 256
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _paper_cut_metrics(
+    current: float, alternative: float, freq: float, alt_freq: float, use_daily: bool, label: str
+) -> dict:
+    """
+    Paper cut yearly impact plus the per-day/week/month figures the dialog shows.
+    With use_daily, `current` is a daily amount and the alternative runs alt_freq times/week.
+    Derived figures come from the unrounded yearly values.
+    """
+    if use_daily:
+        yearly_current = current * 365.0
+        yearly_alternative = alternative * alt_freq * WEEKS_PER_YEAR
+        result = paper_cut_result(yearly_current, yearly_alternative, label)
+    else:
+        result = paper_cut_yearly_impact(current, alternative, freq, label)
+        yearly_current = current * freq * WEEKS_PER_YEAR
+        yearly_alternative = alternative * freq * WEEKS_PER_YEAR
+    result["daily_current"] = yearly_current / 365.0
+    result["weekly_current"] = yearly_current / WEEKS_PER_YEAR
+    result["weekly_alternative"] = yearly_alternative / WEEKS_PER_YEAR
+    result["monthly_savings"] = (yearly_current - yearly_alternative) / 12.0
+    return result
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_monthly_savings(income: float, expenses: float) -> float:
+    return calculate_monthly_savings(income, expenses)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_goal_eta_batch(targets: tuple, current: float, monthly: float, goal_names: tuple, today: date) -> dict:
+    # `today` is part of the key so cached ETAs roll over with the date.
+    return goal_eta_batch(np.array(targets, dtype=np.float64), current, monthly, goal_names, today)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _format_ctx(income: float, expenses: float, savings: float, current: float, goals_items: tuple) -> str:
+    """Budget context string for the AI; cached so unchanged inputs skip the formatting."""
+    return (
+        f"Income: {_USD(income)}, Expenses: {_USD(expenses)}, "
+        f"Monthly savings: {_USD(savings)}, Current savings: {_USD(current)}. "
+        f"Goals: " + ", ".join(f"{k} {_INT_USD(v)}" for k, v in goals_items)
+    )
+
+
+def _cache_stats_rows() -> list:
+    """Entries and bytes per cached function, from Streamlit's (internal) cache stats providers."""
+    from streamlit.runtime.caching import (
+        get_data_cache_stats_provider,
+        get_resource_cache_stats_provider,
+    )
+
+    rows = {}
+    for kind, provider in (
+        ("cache_data", get_data_cache_stats_provider()),
+        ("cache_resource", get_resource_cache_stats_provider()),
+    ):
+        stats = provider.get_stats()
+        if isinstance(stats, dict):  # newer Streamlit groups stats by family
+            stats = [stat for group in stats.values() for stat in group]
+        for stat in stats:
+            row = rows.setdefault(
+                (kind, stat.cache_name),
+                {"cache": kind, "function": stat.cache_name, "entries": 0, "bytes": 0},
+            )
+            row["entries"] += 1
+            row["bytes"] += stat.byte_length
+    return list(rows.values())
+
+
 # ---------------------------------------------------------------------------
 # Dedalus Runner + tools
 # ---------------------------------------------------------------------------
+# Matches a `DEDALUS_API_KEY=value` line and captures the value without quotes or a trailing comment.
+_KEY_RE = re.compile(r'^\s*DEDALUS_API_KEY\s*=\s*["\']?([^"\'#\r\n]+)')
+
+
+@st.cache_data(show_spinner=False)
 def _get_dedalus_api_key() -> str:
-    """Get Dedalus API key: try env, then load .env from app dir and cwd, then parse file directly."""
+    """
+    Get Dedalus API key: try env, then load .env from app dir and cwd, then parse file directly.
+    Cached for the process; "Verify Dedalus key" clears it to re-read .env.
+    """
     from dotenv import dotenv_values
-    for env_path in [_app_dir / ".env", Path.cwd() / ".env"]:
-        p = env_path.resolve()
-        if p.exists():
-            load_dotenv(p)
-    load_dotenv()
     key = (os.environ.get("DEDALUS_API_KEY") or "").strip()
     if not key:
-        for env_path in [_app_dir / ".env", Path.cwd() / ".env"]:
-            p = env_path.resolve()
-            if p.exists():
-                try:
-                    vals = dotenv_values(p)
-                    key = (vals.get("DEDALUS_API_KEY") or "").strip()
-                    if key:
-                        os.environ["DEDALUS_API_KEY"] = key
-                        break
-                except Exception:
-                    pass
-            if key:
-                break
-    if not key:
-        for env_path in [_app_dir / ".env", Path.cwd() / ".env"]:
-            p = env_path.resolve()
-            if p.exists():
-                try:
-                    for line in p.read_text(encoding="utf-8", errors="ignore").splitlines():
-                        s = line.strip()
-                        if s.startswith("DEDALUS_API_KEY="):
-                            key = s.split("=", 1)[1].strip().strip('"').strip("'").split("#")[0].strip()
-                            if key:
-                                os.environ["DEDALUS_API_KEY"] = key
+        # Resolve and stat each candidate once (deduplicated when cwd is the app dir); per file,
+        # try dotenv first and fall back to the raw line scan.
+        paths = [p for p in dict.fromkeys(e.resolve() for e in (_app_dir / ".env", Path.cwd() / ".env")) if p.exists()]
+        for p in paths:
+            try:
+                key = (dotenv_values(p).get("DEDALUS_API_KEY") or "").strip()
+                if not key:
+                    # Stream line by line and stop at the first key line instead of reading the whole file.
+                    with p.open("r", encoding="utf-8", errors="ignore") as fh:
+                        for line in fh:
+                            m = _KEY_RE.match(line)
+                            if m:
+                                key = m.group(1).strip()
                                 break
-                except Exception:
-                    pass
+            except Exception:
+                pass
             if key:
+                os.environ["DEDALUS_API_KEY"] = key
                 break
     if not key or key.lower() in ("your_key_here", "your_actual_key_here"):
         return ""
     return key
 
 
-def run_ai_assistant(user_message: str, budget_context: str) -> str:
+@st.cache_resource(show_spinner=False)
+def _dedalus():
+    """
+    The dedalus_labs module, imported on first use of the assistant and cached for the process
+    (None if the SDK isn't installed, so the dashboard still works without it).
+    """
+    try:
+        import dedalus_labs
+    except ImportError:
+        return None
+    return dedalus_labs
+
+
+@st.cache_resource(show_spinner=False)
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """
+    One event loop per process, running forever in a daemon thread.
+    The cached client's connection pool is bound to it, so coroutines are submitted
+    with run_coroutine_threadsafe instead of spinning up a new loop per message.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="dedalus-loop", daemon=True).start()
+    return loop
+
+
+@st.cache_resource(show_spinner=False)
+def _get_runner(api_key: str):
+    """
+    Build the Dedalus client + runner once per API key and reuse them (and their HTTP pool)
+    across reruns; a changed key gets its own client instead of a stale one.
+    """
+    d = _dedalus()
+    client = d.AsyncDedalus(api_key=api_key)
+    return d.DedalusRunner(client)
+
+
+def _bounded_tool(fn, sem: asyncio.Semaphore):
+    """
+    Async wrapper for a sync tool: runs it in a worker thread under a shared semaphore,
+    so parallel tool calls in one turn overlap without unbounded fan-out.
+    functools.wraps keeps the name, docstring and signature the runner builds the schema from.
+    """
+    @functools.wraps(fn)
+    async def inner(**kwargs):
+        async with sem:
+            return await asyncio.to_thread(fn, **kwargs)
+    return inner
+
+
+# Prompt sent to the runner; filled with the budget context and the user's question.
+PROMPT_TMPL = (
+    "Current user budget context (use these numbers when calling tools):\n{ctx}\n\n"
+    "User question: {q}\n\n"
+    "Use the tools when relevant: e.g. for 'how much would I save if I quit Starbucks?' "
+    "call paper_cut_yearly_impact; for 'when can I afford X?' call goal_eta. "
+    "Reply in a short, helpful way and include the numbers from the tools."
+)
+
+# Models the assistant uses, preferred first: chat hedges through them in order (see _race_models),
+# Verify tries them in order.
+_MODELS = (
+    "anthropic/claude-opus-4-6",
+    "anthropic/claude-sonnet-4",
+    "anthropic/claude-3-5-sonnet-latest",
+)
+
+# Tools the assistant can call (see utils.py).
+AI_TOOLS = (paper_cut_yearly_impact, goal_eta, calculate_monthly_savings)
+
+
+async def _dedalus_stream(prompt: str, model: str, runner):
+    """
+    Stream one model's reply as text deltas, running the tools as bounded async tasks.
+    Chunks without text (e.g. tool-call deltas) yield "" so callers can see the model is alive.
+    """
+    sem = asyncio.Semaphore(8)
+    tools = [_bounded_tool(fn, sem) for fn in AI_TOOLS]
+    async for chunk in runner.run(input=prompt, model=model, tools=tools, stream=True):
+        yield chunk.choices[0].delta.content or ""
+
+
+# Head start each model gets before the next fallback is started alongside it.
+AI_HEDGE_DELAY_S = 4.0
+
+
+async def _race_models(prompt: str, models, runner):
+    """
+    Hedged start over the fallback models: stream the preferred (first) model and start the
+    next one alongside it only if no running model has sent any chunk (tool-call deltas count)
+    within AI_HEDGE_DELAY_S, or as soon as a running model fails or ends without text. The
+    first model to produce text wins; the others are cancelled or closed. A healthy preferred
+    model, tool round-trips included, costs a single call; only stalled or failing turns pay
+    for the extra (paid) fallback calls and their tool loops.
+    Returns (first_chunk, stream) for the winner, (None, None) if the models that didn't fail
+    all returned empty replies, or None if every model failed with a 500; any other error is
+    re-raised once all models failed.
+    """
+    d = _dedalus()
+    queued = iter(models)
+    tasks = {}
+
+    def start_next():
+        model = next(queued, None)
+        if model is None:
+            return None
+        agen = _dedalus_stream(prompt, model, runner)
+        task = asyncio.ensure_future(agen.__anext__())
+        tasks[task] = agen
+        return task
+
+    pending = {start_next()} - {None}
+    errors = []
+    empty = False
+    alive = False
+    winner = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, timeout=AI_HEDGE_DELAY_S, return_when=asyncio.FIRST_COMPLETED)
+            dropped = 0
+            for task in done:
+                agen = tasks.pop(task)
+                exc = task.exception()
+                if exc is None:
+                    chunk = task.result()
+                    if not chunk:
+                        # No text yet (e.g. a tool round-trip), but the model is working: keep reading.
+                        alive = True
+                        task = asyncio.ensure_future(agen.__anext__())
+                        tasks[task] = agen
+                        pending.add(task)
+                    elif winner is None:
+                        winner = (chunk, agen)
+                    else:
+                        await agen.aclose()
+                    continue
+                # An empty reply counts as a failure: keep waiting on the other models.
+                if isinstance(exc, StopAsyncIteration):
+                    empty = True
+                else:
+                    errors.append(exc)
+                dropped += 1
+            if winner is None and (dropped or not (done or alive)):
+                # Dropped models, or silence from every running one: start the next fallback(s).
+                for _ in range(dropped or 1):
+                    task = start_next()
+                    if task is not None:
+                        pending.add(task)
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    if winner is not None:
+        return winner
+    for exc in errors:
+        if not isinstance(exc, d.InternalServerError):
+            raise exc
+    return (None, None) if empty else None
+
+
+# Longest the script thread waits for the next streamed chunk before giving up.
+AI_CHUNK_TIMEOUT_S = 120
+
+
+def _iter_on_loop(agen):
+    """
+    Drive an async generator on the background loop, yielding its items to this (script) thread.
+    The network awaits happen on the loop thread, so other sessions keep running meanwhile.
+    """
+    loop = _get_loop()
+    while True:
+        future = asyncio.run_coroutine_threadsafe(agen.__anext__(), loop)
+        try:
+            item = future.result(timeout=AI_CHUNK_TIMEOUT_S)
+        except StopAsyncIteration:
+            return
+        except TimeoutError:
+            future.cancel()  # cancelling the pending __anext__ also finalizes the generator
+            raise
+        try:
+            yield item
+        except GeneratorExit:
+            # Consumer stopped early: close the generator on its own loop.
+            asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+            raise
+
+
+def run_ai_assistant(user_message: str, budget_context: str):
     """
     Run Dedalus Runner with Paper Cut and Goal ETA tools.
     Passes budget context so the AI can call tools with current numbers.
-    Uses explicit API key, tries fallback models on 500.
+    Uses explicit API key, hedges across the fallback models so a 500, empty or slow model doesn't block the reply.
+    Yields the reply in chunks as they stream in (feed it to st.write_stream).
     """
-    from dedalus_labs import AsyncDedalus, DedalusRunner
-    from dedalus_labs import (
-        InternalServerError,
-        APIConnectionError,
-        RateLimitError,
-        APIError,
-    )
+    d = _dedalus()
+    if d is None:
+        yield "⚠️ The Dedalus SDK is not installed. Run `pip install -r requirements.txt` and restart the app."
+        return
 
+    # Read through the cache on each call (not a module global): chat turns rerun only the AI
+    # fragment, so a key found by "Verify Dedalus key" must be picked up without a full rerun.
     api_key = _get_dedalus_api_key()
     if not api_key:
-        return "⚠️ DEDALUS_API_KEY is not set or still placeholder. Add your real key to `.env` in the project folder and restart the app."
-
-    # Models to try in order (500 = server error; try Dedalus-docs model first)
-    models_to_try = [
-        "anthropic/claude-opus-4-6",
-        "anthropic/claude-sonnet-4",
-        "anthropic/claude-3-5-sonnet-latest",
-    ]
-    prompt = (
-        f"Current user budget context (use these numbers when calling tools):\n{budget_context}\n\n"
-        f"User question: {user_message}\n\n"
-        "Use the tools when relevant: e.g. for 'how much would I save if I quit Starbucks?' "
-        "call paper_cut_yearly_impact; for 'when can I afford X?' call goal_eta. "
-        "Reply in a short, helpful way and include the numbers from the tools."
-    )
-    tools = [paper_cut_yearly_impact, goal_eta, calculate_monthly_savings]
+        yield "⚠️ DEDALUS_API_KEY is not set or still placeholder. Add your real key to `.env` in the project folder and restart the app."
+        return
 
-    async def _run(model: str):
-        client = AsyncDedalus(api_key=api_key)
-        runner = DedalusRunner(client)
-        response = await runner.run(input=prompt, model=model, tools=tools)
-        return response.final_output or "No response."
+    prompt = PROMPT_TMPL.format(ctx=budget_context, q=user_message)
+    runner = _get_runner(api_key)
 
-    last_error = None
-    for model in models_to_try:
+    try:
+        future = asyncio.run_coroutine_threadsafe(_race_models(prompt, _MODELS, runner), _get_loop())
         try:
-            return asyncio.run(_run(model))
-        except InternalServerError as e:
-            last_error = e
-            continue
-        except RateLimitError:
-            return "⚠️ Rate limit reached. Please wait a minute and try again."
-        except APIConnectionError:
-            return "⚠️ Could not reach Dedalus. Check your internet connection and try again."
-        except APIError as e:
-            return f"⚠️ API error: {getattr(e, 'message', str(e))}. Try again or check your API key."
-        except Exception as e:
-            return f"⚠️ Something went wrong: {e}. Try again or check the console for details."
-
-    return (
-        "⚠️ Dedalus API returned server errors for all models tried. "
-        "Please try again in a few minutes or contact support@dedaluslabs.ai."
-    )
+            winner = future.result(timeout=AI_CHUNK_TIMEOUT_S)
+        except TimeoutError:
+            future.cancel()
+            raise
+        if winner is None:
+            yield (
+                "⚠️ Dedalus API returned server errors for all models tried. "
+                "Please try again in a few minutes or contact support@dedaluslabs.ai."
+            )
+            return
+        first, stream = winner
+        if first is None:
+            yield "No response."
+            return
+        yield first
+        yield from (chunk for chunk in _iter_on_loop(stream) if chunk)
+    except d.InternalServerError:
+        # Pre-reply 500s are absorbed by _race_models, so this one hit mid-stream.
+        yield "\n\n⚠️ Dedalus returned a server error mid-reply. Please try again."
+    except d.RateLimitError:
+        yield "⚠️ Rate limit reached. Please wait a minute and try again."
+    except d.APIConnectionError:
+        yield "⚠️ Could not reach Dedalus. Check your internet connection and try again."
+    except d.APIError as e:
+        yield f"⚠️ API error: {getattr(e, 'message', str(e))}. Try again or check your API key."
+    except TimeoutError:
+        yield "⚠️ Dedalus took too long to respond. Please try again."
+    except Exception as e:
+        yield f"⚠️ Something went wrong: {e}. Try again or check the console for details."
 
 
 # ---------------------------------------------------------------------------
 # Dialog: Enter your income
 # ---------------------------------------------------------------------------
+def _save_income_dialog():
+    st.session_state.income = st.session_state.dlg_income
+    st.session_state.expenses = st.session_state.dlg_expenses
+    # Drop the keyed sidebar inputs' state so they re-read the new values instead of keeping
+    # (and on the next Apply re-applying) stale ones.
+    for key in ("income_input", "expenses_input"):
+        st.session_state.pop(key, None)
+
+
 @st.dialog("Enter your income", width="large", dismissible=False)
 def dialog_income():
     if st.button("← Back to dashboard", key="back_income"):
         st.session_state.open_dialog = None
         st.rerun()
     st.caption("Set income and expenditure. Money saved = Income − Expenditure.")
-    st.session_state.income = st.number_input(
-        "Monthly income ($)",
-        min_value=0.0,
-        value=float(st.session_state.income),
-        step=100.0,
-        key="dlg_income",
-    )
-    st.session_state.expenses = st.number_input(
-        "Monthly expenses ($)",
-        min_value=0.0,
-        value=float(st.session_state.expenses),
-        step=50.0,
-        key="dlg_expenses",
-    )
+    # Inputs here and in the other forms are batched: one rerun per submit, not per widget change.
+    with st.form("dlg_income_form"):
+        st.number_input(
+            "Monthly income ($)",
+            min_value=0.0,
+            value=float(st.session_state.income),
+            step=100.0,
+            key="dlg_income",
+        )
+        st.number_input(
+            "Monthly expenses ($)",
+            min_value=0.0,
+            value=float(st.session_state.expenses),
+            step=50.0,
+            key="dlg_expenses",
+        )
+        st.form_submit_button("Save", on_click=_save_income_dialog)
     x, y = st.session_state.income, st.session_state.expenses
     money_saved_display = x - y
     col_x, col_y = st.columns(2)
     with col_x:
-        st.metric("Income", f"$ {x:,.2f}")
+        st.metric("Income", _USD(x))
     with col_y:
-        st.metric("Expenditure", f"$ {y:,.2f}")
+        st.metric("Expenditure", _USD(y))
     st.markdown("**Money saved** = Income − Expenditure")
     if money_saved_display < 0:
-        st.warning(f"**Money saved = ${money_saved_display:,.2f}** (negative — expenditure is greater than income)")
+        st.warning(f"**Money saved = {_USD(money_saved_display)}** (negative — expenditure is greater than income)")
     else:
-        st.success(f"**Money saved = ${money_saved_display:,.2f}**")
+        st.success(f"**Money saved = {_USD(money_saved_display)}**")
 
 
 # ---------------------------------------------------------------------------
@@ -217,86 +506,77 @@ def dialog_papercut():
     )
     habit_label = habit_name.strip() if habit_name else "Current habit"
     use_daily = st.checkbox("Enter current habit as daily amount ($) instead of per occurrence × times/week", key="dlg_pc_use_daily")
-    pc_col1, pc_col2 = st.columns(2)
-    with pc_col1:
-        st.markdown(f"**{habit_label}**")
-        if use_daily:
-            daily_amount = st.number_input(
-                "Daily amount ($)",
-                min_value=0.0,
-                value=3.21,
-                step=0.25,
-                key="dlg_pc_daily",
-            )
-            yearly_from_daily = daily_amount * 365.0
-            current_exp = daily_amount
-            freq = 7.0 if daily_amount else 0.0
-        else:
-            current_exp = st.number_input(
+    with st.form("pc"):
+        pc_col1, pc_col2 = st.columns(2)
+        with pc_col1:
+            st.markdown(f"**{habit_label}**")
+            if use_daily:
+                daily_amount = st.number_input(
+                    "Daily amount ($)",
+                    min_value=0.0,
+                    value=3.21,
+                    step=0.25,
+                    key="dlg_pc_daily",
+                )
+                current_exp = daily_amount
+                freq = 7.0 if daily_amount else 0.0
+            else:
+                current_exp = st.number_input(
+                    "Cost per occurrence ($)",
+                    min_value=0.0,
+                    value=4.50,
+                    step=0.5,
+                    key="dlg_pc_current",
+                )
+                freq = st.number_input(
+                    "Times per week",
+                    min_value=0.0,
+                    value=5.0,
+                    step=0.5,
+                    key="dlg_pc_freq",
+                )
+        with pc_col2:
+            st.markdown("**Alternative**")
+            alt_exp = st.number_input(
                 "Cost per occurrence ($)",
                 min_value=0.0,
-                value=4.50,
-                step=0.5,
-                key="dlg_pc_current",
-            )
-            freq = st.number_input(
-                "Times per week",
-                min_value=0.0,
-                value=5.0,
-                step=0.5,
-                key="dlg_pc_freq",
-            )
-            yearly_from_daily = None
-    with pc_col2:
-        st.markdown("**Alternative**")
-        alt_exp = st.number_input(
-            "Cost per occurrence ($)",
-            min_value=0.0,
-            value=0.20,
-            step=0.1,
-            key="dlg_pc_alt",
-        )
-        if use_daily:
-            alt_freq = st.number_input(
-                "Times per week",
-                min_value=0.0,
-                value=5.0,
-                step=0.5,
-                key="dlg_pc_alt_freq",
+                value=0.20,
+                step=0.1,
+                key="dlg_pc_alt",
             )
-        else:
-            alt_freq = freq
-        pc_label = st.text_input("Label (optional)", value="", placeholder="e.g. Starbucks → home coffee", key="dlg_pc_label")
-    if use_daily and yearly_from_daily is not None:
-        yearly_alt = alt_exp * alt_freq * 52.0
-        result = {
-            "yearly_current": round(yearly_from_daily, 2),
-            "yearly_alternative": round(yearly_alt, 2),
-            "yearly_savings": round(yearly_from_daily - yearly_alt, 2),
-            "description": pc_label or habit_label,
-        }
-    else:
-        result = paper_cut_yearly_impact(current_exp, alt_exp, freq, pc_label or habit_label)
-    daily_current = result["yearly_current"] / 365.0
-    weekly_current = result["yearly_current"] / 52.0
-    weekly_alt = result["yearly_alternative"] / 52.0
-    monthly_savings_pc = (result["yearly_savings"] / 12) if result["yearly_savings"] else 0
+            if use_daily:
+                alt_freq = st.number_input(
+                    "Times per week",
+                    min_value=0.0,
+                    value=5.0,
+                    step=0.5,
+                    key="dlg_pc_alt_freq",
+                )
+            else:
+                alt_freq = freq
+            pc_label = st.text_input("Label (optional)", value="", placeholder="e.g. Starbucks → home coffee", key="dlg_pc_label")
+        st.form_submit_button("Calculate")
+    result = _paper_cut_metrics(current_exp, alt_exp, freq, alt_freq, use_daily, pc_label or habit_label)
     st.markdown("---")
     st.markdown("### 📊 Impact")
     comp1, comp2, comp3 = st.columns(3)
     with comp1:
         st.metric(
             f"{habit_label} (year)",
-            f"${result['yearly_current']:,.2f}",
-            help=f"~${daily_current:,.2f}/day · ~${weekly_current:,.2f}/week",
+            _USD(result["yearly_current"]),
+            help=f"~{_USD(result['daily_current'])}/day · ~{_USD(result['weekly_current'])}/week",
         )
     with comp2:
-        st.metric("With alternative (year)", f"${result['yearly_alternative']:,.2f}", help=f"~${weekly_alt:,.2f}/week")
+        st.metric(
+            "With alternative (year)",
+            _USD(result["yearly_alternative"]),
+            help=f"~{_USD(result['weekly_alternative'])}/week",
+        )
     with comp3:
-        st.metric("You save (year)", f"${result['yearly_savings']:,.2f}", help=f"~${monthly_savings_pc:,.2f}/month")
+        st.metric("You save (year)", _USD(result["yearly_savings"]), help=f"~{_USD(result['monthly_savings'])}/month")
     st.success(
-        f"**Yearly impact:** You spend **${result['yearly_current']:,.2f}** on **{habit_label}** now → "
-        f"**${result['yearly_alternative']:,.2f}** with alternative → **Save ${result['yearly_savings']:,.2f}/year**."
+        f"**Yearly impact:** You spend **{_USD(result['yearly_current'])}** on **{habit_label}** now → "
+        f"**{_USD(result['yearly_alternative'])}** with alternative → **Save {_USD(result['yearly_savings'])}/year**."
     )
 
 
@@ -310,21 +590,29 @@ def dialog_goal():
         st.rerun()
     st.caption("Set goal amounts below. We compare each goal to your monthly income and show if it’s attainable.")
     monthly_income = st.session_state.income
-    monthly_savings_dlg = calculate_monthly_savings(st.session_state.income, st.session_state.expenses)
+    monthly_savings_dlg = _cached_monthly_savings(st.session_state.income, st.session_state.expenses)
     current = st.session_state.current_savings
 
-    # Goal amount input boxes (moved from sidebar)
+    # Goal amounts: one editable table (moved from sidebar)
     st.markdown("### 🎯 Goal amounts")
-    goal_input_cols = st.columns(len(GOAL_CATEGORIES))
-    for i, g in enumerate(GOAL_CATEGORIES):
-        with goal_input_cols[i]:
-            st.session_state.goals[g] = st.number_input(
-                f"{g} ($)",
-                min_value=0.0,
-                value=float(st.session_state.goals.get(g, 0)),
-                step=1000.0,
-                key=f"dlg_goal_{g}",
-            )
+    with st.form("dlg_goals_form"):
+        edited = st.data_editor(
+            [{"Goal": g, "Target ($)": float(st.session_state.goals.get(g, 0))} for g in GOAL_CATEGORIES],
+            key="dlg_goals_editor",
+            disabled=["Goal"],
+            hide_index=True,
+            num_rows="fixed",
+            column_config={"Target ($)": st.column_config.NumberColumn(min_value=0.0, step=1000.0, format="$%.0f")},
+        )
+        if st.form_submit_button("Update goals"):
+            # Only known categories are written back (the editor hands rows back as plain dicts).
+            new_goals = {
+                row["Goal"]: max(0.0, float(row["Target ($)"] or 0.0))
+                for row in edited
+                if row.get("Goal") in GOAL_CATEGORIES_SET
+            }
+            if new_goals != {g: st.session_state.goals.get(g, 0) for g in GOAL_CATEGORIES}:
+                st.session_state.goals.update(new_goals)
     st.markdown("---")
 
     # Compare goals to salary (attainability)
@@ -336,90 +624,121 @@ def dialog_goal():
         ["Default (Home, Car, Vacation, School)", "Soonest ETA first", "Target amount (low → high)", "Target amount (high → low)"],
         key="dlg_goal_sort",
     )
-    goals_data = []
-    for goal_name in GOAL_CATEGORIES:
-        target = st.session_state.goals.get(goal_name, 0)
-        eta_result = goal_eta(
-            goal_amount=target,
-            current_savings=current,
-            monthly_savings=monthly_savings_dlg,
-            goal_name=goal_name,
+    targets = np.fromiter(
+        (st.session_state.goals.get(g, 0) for g in GOAL_CATEGORIES),
+        dtype=np.float64,
+        count=len(GOAL_CATEGORIES),
+    )
+    today = datetime.now().date()
+    eta = _cached_goal_eta_batch(tuple(targets.tolist()), current, monthly_savings_dlg, GOAL_CATEGORIES, today)
+    # Goal vs salary and progress for every goal in one pass (NaN = not applicable)
+    has_target = targets > 0
+    if monthly_income > 0:
+        months_of_income = np.where(has_target, targets / monthly_income, np.nan)
+    else:
+        months_of_income = np.full_like(targets, np.nan)
+    progress_pct = np.where(has_target, np.minimum(100.0, current / np.where(has_target, targets, 1.0) * 100.0), np.nan)
+    to_go = np.maximum(0.0, targets - current)
+    goals_data = list(
+        zip(
+            GOAL_CATEGORIES,
+            targets.tolist(),
+            eta["message"],
+            eta["eta_date"],
+            eta["reachable"].tolist(),
+            months_of_income.tolist(),
+            progress_pct.tolist(),
+            to_go.tolist(),
         )
-        # Compare goal to salary: months of income, and attainability note
-        months_of_income = (target / monthly_income) if monthly_income > 0 and target > 0 else None
-        goals_data.append((goal_name, target, eta_result, months_of_income))
+    )
+    # Sort keys come straight from the arrays above; a stable argsort keeps the default order on ties.
+    order = None
     if "Soonest ETA first" in sort_option:
-        def eta_months(item):
-            name, target, eta, _ = item
-            m = eta.get("months_needed")
-            return m if m is not None else float("inf")
-        goals_data.sort(key=eta_months)
+        order = np.argsort(eta["months_needed"], kind="stable")  # inf = unreachable, sorts last
     elif "Target amount (low → high)" in sort_option:
-        goals_data.sort(key=lambda x: x[1])
+        order = np.argsort(targets, kind="stable")
     elif "Target amount (high → low)" in sort_option:
-        goals_data.sort(key=lambda x: x[1], reverse=True)
-    goal_cols = st.columns(len(goals_data))
-    for i, (goal_name, target, eta_result, months_of_income) in enumerate(goals_data):
-        with goal_cols[i]:
-            st.subheader(goal_name)
-            st.write(f"Target: **${target:,.0f}**")
-            if monthly_income > 0 and target > 0 and months_of_income is not None:
-                st.caption(f"= **{months_of_income:.1f}×** your monthly income")
-                if months_of_income <= 6:
-                    st.success("Within reach (≤ 6 months of income)")
-                elif months_of_income <= 24:
-                    st.info("Attainable (≤ 2 years of income)")
-                else:
-                    st.warning("Large goal — save consistently to reach it")
-            if target > 0:
-                progress_pct = min(100.0, (current / target) * 100.0)
-                st.progress(progress_pct / 100.0)
-                st.caption(f"{progress_pct:.0f}% of goal · ${max(0, target - current):,.0f} to go")
-            st.write(eta_result["message"])
-            if eta_result.get("eta_date"):
-                st.caption(f"ETA: ~{eta_result['eta_date']}")
-            elif not eta_result.get("reachable", True) or eta_result.get("months_needed") is None:
-                st.caption("Increase monthly savings to see an ETA.")
+        order = np.argsort(-targets, kind="stable")
+    if order is not None:
+        goals_data = [goals_data[i] for i in order.tolist()]
+    # One markdown table for all goals (a single element instead of ~4 per goal column).
+    rows = []
+    for goal_name, target, eta_message, eta_iso, reachable, income_multiple, pct, remaining in goals_data:
+        vs_income = "—"
+        if not np.isnan(income_multiple):
+            if income_multiple <= 6:
+                note = "Within reach (≤ 6 months of income)"
+            elif income_multiple <= 24:
+                note = "Attainable (≤ 2 years of income)"
+            else:
+                note = "Large goal — save consistently to reach it"
+            vs_income = f"**{income_multiple:.1f}×** monthly income · {note}"
+        progress = "—"
+        if not np.isnan(pct):
+            progress = f"{pct:.0f}% · {_INT_USD(remaining)} to go"
+        if eta_iso:
+            eta_date = f"~{eta_iso}"
+        elif not reachable:
+            eta_date = "Increase monthly savings to see an ETA."
+        else:
+            eta_date = "—"
+        rows.append(
+            f"| **{goal_name}** | {_INT_USD(target)} | {vs_income} | {progress} | {eta_message} | {eta_date} |"
+        )
+    table = "| Goal | Target | vs income | Progress | ETA | Date |\n|---|---|---|---|---|---|\n" + "\n".join(rows)
+    # Escape $ so pairs of dollar amounts aren't rendered as LaTeX.
+    st.markdown(table.replace("$", "\\$"))
 
 
 # ---------------------------------------------------------------------------
 # Sidebar: Budget inputs
 # ---------------------------------------------------------------------------
-with st.sidebar:
+@st.fragment
+def _budget_inputs_fragment():
+    """Sidebar budget inputs; Apply reruns only this fragment (dialogs and chat read session state)."""
+    # Coerce the budget numbers once per run; the widgets and savings metric reuse them
+    # (and float keys keep the st.cache_data lookups consistent).
+    income_f = float(st.session_state.income)
+    expenses_f = float(st.session_state.expenses)
+    current_savings_f = float(st.session_state.current_savings)
+
     st.markdown("### 📌 Budget inputs")
-    st.session_state.income = st.number_input(
-        "Monthly income ($)",
-        min_value=0.0,
-        value=float(st.session_state.income),
-        step=100.0,
-        key="income_input",
-    )
-    st.session_state.expenses = st.number_input(
-        "Monthly expenses ($)",
-        min_value=0.0,
-        value=float(st.session_state.expenses),
-        step=50.0,
-        key="expenses_input",
-    )
-    monthly_savings = calculate_monthly_savings(
-        st.session_state.income, st.session_state.expenses
-    )
-    st.metric("Monthly savings", f"${monthly_savings:,.2f}")
-    st.session_state.current_savings = st.number_input(
-        "Current total savings ($)",
-        min_value=0.0,
-        value=float(st.session_state.current_savings),
-        step=500.0,
-        key="savings_input",
-    )
+    with st.form("budget"):
+        income = st.number_input(
+            "Monthly income ($)",
+            min_value=0.0,
+            value=income_f,
+            step=100.0,
+            key="income_input",
+        )
+        expenses = st.number_input(
+            "Monthly expenses ($)",
+            min_value=0.0,
+            value=expenses_f,
+            step=50.0,
+            key="expenses_input",
+        )
+        current_savings = st.number_input(
+            "Current total savings ($)",
+            min_value=0.0,
+            value=current_savings_f,
+            step=500.0,
+            key="savings_input",
+        )
+        if st.form_submit_button("Apply"):
+            st.session_state.income = income_f = income
+            st.session_state.expenses = expenses_f = expenses
+            st.session_state.current_savings = current_savings_f = current_savings
+    monthly_savings = _cached_monthly_savings(income_f, expenses_f)
+    st.metric("Monthly savings", _USD(monthly_savings))
+    if st.query_params.get("debug") == "1":
+        with st.expander("Cache stats"):
+            st.caption(f"cache_data: ttl {CACHE_TTL_S // 3600} h, max {CACHE_MAX_ENTRIES} entries per function")
+            st.dataframe(_cache_stats_rows(), hide_index=True)
 
 
-# Build context string for the AI (so it can call tools with current data)
-budget_context = (
-    f"Income: ${st.session_state.income:,.2f}, Expenses: ${st.session_state.expenses:,.2f}, "
-    f"Monthly savings: ${monthly_savings:,.2f}, Current savings: ${st.session_state.current_savings:,.2f}. "
-    f"Goals: " + ", ".join(f"{k} ${v:,.0f}" for k, v in st.session_state.goals.items())
-)
+with st.sidebar:
+    _budget_inputs_fragment()
 
 
 # ---------------------------------------------------------------------------
@@ -429,29 +748,30 @@ st.markdown("# 📌 PIN PLAN")
 st.caption("Home Screen — choose an option below.")
 st.markdown("---")
 
+def _open_dialog(which: str):
+    # on_click runs before the click's own rerun, so no extra st.rerun() is needed here.
+    # The dialogs' "Back to dashboard" buttons keep st.rerun(): a dialog is a fragment, and
+    # only a full-app rerun takes it off the page.
+    st.session_state.open_dialog = which
+
+
 # Three cards in a row (like the sketch: enter your income | Paper cut Analyser | GOAL)
 card1, card2, card3 = st.columns(3)
 with card1:
     with st.container():
         st.markdown("**Enter your income**")
         st.caption("Income, expenditure & money saved")
-        if st.button("Open →", key="btn_income"):
-            st.session_state.open_dialog = "income"
-            st.rerun()
+        st.button("Open →", key="btn_income", on_click=_open_dialog, args=("income",))
 with card2:
     with st.container():
         st.markdown("**Paper cut Analyser**")
         st.caption("Small expenses vs alternatives")
-        if st.button("Open →", key="btn_papercut"):
-            st.session_state.open_dialog = "papercut"
-            st.rerun()
+        st.button("Open →", key="btn_papercut", on_click=_open_dialog, args=("papercut",))
 with card3:
     with st.container():
         st.markdown("**GOAL**")
         st.caption("Track goals & ETAs")
-        if st.button("Open →", key="btn_goal"):
-            st.session_state.open_dialog = "goal"
-            st.rerun()
+        st.button("Open →", key="btn_goal", on_click=_open_dialog, args=("goal",))
 
 st.markdown("---")
 
@@ -466,249 +786,90 @@ elif st.session_state.open_dialog == "goal":
 st.markdown("---")
 
 # ---------------------------------------------------------------------------
-# Section: Enter your income (dead code; kept for reference) (Income $x, Expenditure $y, money saved; if y > x → -ve)
+# AI Assistant (Dedalus Tool Calling) — always visible at bottom
 # ---------------------------------------------------------------------------
-if False:  # moved to dialog_income()
-    st.header("Enter your income")
-    st.caption("Use the sidebar to set Income and Expenditure. Here’s your result.")
-    x = st.session_state.income
-    y = st.session_state.expenses
-    # Money saved = Income − Expenditure; if expenditure > income, money saved is negative (per sketch).
-    money_saved_display = x - y
-    col_x, col_y = st.columns(2)
-    with col_x:
-        st.metric("Income", f"$ {x:,.2f}")
-    with col_y:
-        st.metric("Expenditure", f"$ {y:,.2f}")
-    st.markdown("**Money saved** = Income − Expenditure")
-    if money_saved_display < 0:
-        st.warning(f"**Money saved = ${money_saved_display:,.2f}** (negative — expenditure is greater than income)")
+@st.fragment
+def _ai_assistant_fragment():
+    """AI Assistant section; chat and Verify reruns stay inside this fragment, not the whole app."""
+    st.header("AI Assistant")
+    dedalus_key_set = bool(_get_dedalus_api_key())
+    if dedalus_key_set:
+        st.caption("Dedalus: API key set. Ask about savings or goals (Tool Calling: Paper Cut & Goal ETA).")
     else:
-        st.success(f"**Money saved = ${money_saved_display:,.2f}**")
-    st.divider()
-
-# ---------------------------------------------------------------------------
-# Section: Paper cut Analyser
-# ---------------------------------------------------------------------------
-if False:  # moved to dialog_papercut()
-    st.header("Paper cut Analyser")
-    st.caption("Compare high-frequency small expenses vs responsible alternatives. Name your habit and see yearly impact.")
-    with st.expander("How it works", expanded=False):
-        st.markdown(
-            "Enter what you spend **per occurrence** (e.g. $4.50 per coffee) and how often per week, or use **daily amount**. "
-            "Then enter the **alternative** cost. We compute the yearly impact."
-        )
-    # Habit name (rename the habit)
-    habit_name = st.text_input(
-        "Name this habit",
-        value="",
-        placeholder="e.g. Starbucks coffee, Lunch out",
-        key="pc_habit_name",
-        help="Give your habit a name so the impact section shows it.",
-    )
-    habit_label = habit_name.strip() if habit_name else "Current habit"
-    # Input mode: per occurrence × frequency (old) OR daily amount
-    use_daily = st.checkbox("Enter current habit as daily amount ($) instead of per occurrence × times/week", key="pc_use_daily")
-    pc_col1, pc_col2 = st.columns(2)
-    with pc_col1:
-        st.markdown(f"**{habit_label}**")
-        if use_daily:
-            daily_amount = st.number_input(
-                "Daily amount ($)",
-                min_value=0.0,
-                value=3.21,
-                step=0.25,
-                key="pc_daily",
-                help="What you spend per day on this habit",
-            )
-            yearly_from_daily = daily_amount * 365.0
-            current_exp = daily_amount
-            freq = 7.0 if daily_amount else 0.0
-        else:
-            current_exp = st.number_input(
-                "Cost per occurrence ($)",
-                min_value=0.0,
-                value=4.50,
-                step=0.5,
-                key="pc_current",
-                help="e.g. price of one coffee",
-            )
-            freq = st.number_input(
-                "Times per week",
-                min_value=0.0,
-                value=5.0,
-                step=0.5,
-                key="pc_freq",
-            )
-            yearly_from_daily = None
-    with pc_col2:
-        st.markdown("**Alternative**")
-        alt_exp = st.number_input(
-            "Cost per occurrence ($)",
-            min_value=0.0,
-            value=0.20,
-            step=0.1,
-            key="pc_alt",
-            help="e.g. home coffee cost",
-        )
-        if use_daily:
-            alt_freq = st.number_input(
-                "Times per week",
-                min_value=0.0,
-                value=5.0,
-                step=0.5,
-                key="pc_alt_freq",
-                help="How often you'd use the alternative per week",
-            )
+        st.warning("Dedalus: API key not set. Add `DEDALUS_API_KEY` to your `.env` in the project folder and restart the app.")
+        with st.expander("Where the app looks for .env"):
+            st.code(f"1. {_app_dir / '.env'}\n2. {Path.cwd() / '.env'}", language="text")
+            st.caption("Ensure .env is in the same folder as app.py and contains: DEDALUS_API_KEY=your_key")
+    if st.button("Verify Dedalus key", key="verify_dedalus"):
+        _get_dedalus_api_key.clear()
+        key = _get_dedalus_api_key()
+        if not key:
+            st.error("Key not found. Check that .env exists next to app.py and has DEDALUS_API_KEY=... (no quotes)")
+        elif (d := _dedalus()) is None:
+            st.error("The Dedalus SDK is not installed. Run `pip install -r requirements.txt` and restart the app.")
         else:
-            alt_freq = freq
-        pc_label = st.text_input("Label (optional)", value="", placeholder="e.g. Starbucks → home coffee", key="pc_label")
-    if use_daily and yearly_from_daily is not None:
-        yearly_alt = alt_exp * alt_freq * 52.0
-        result = {
-            "yearly_current": round(yearly_from_daily, 2),
-            "yearly_alternative": round(yearly_alt, 2),
-            "yearly_savings": round(yearly_from_daily - yearly_alt, 2),
-            "description": pc_label or habit_label,
-        }
-    else:
-        result = paper_cut_yearly_impact(current_exp, alt_exp, freq, pc_label or habit_label)
-    daily_current = result["yearly_current"] / 365.0
-    weekly_current = result["yearly_current"] / 52.0
-    weekly_alt = result["yearly_alternative"] / 52.0
-    monthly_savings_pc = (result["yearly_savings"] / 12) if result["yearly_savings"] else 0
-    st.markdown("---")
-    st.markdown("### 📊 Impact")
-    comp1, comp2, comp3 = st.columns(3)
-    with comp1:
-        st.metric(
-            f"{habit_label} (year)",
-            f"${result['yearly_current']:,.2f}",
-            help=f"~${daily_current:,.2f}/day · ~${weekly_current:,.2f}/week",
-        )
-    with comp2:
-        st.metric("With alternative (year)", f"${result['yearly_alternative']:,.2f}", help=f"~${weekly_alt:,.2f}/week")
-    with comp3:
-        st.metric("You save (year)", f"${result['yearly_savings']:,.2f}", help=f"~${monthly_savings_pc:,.2f}/month")
-    st.success(
-        f"**Yearly impact:** You spend **${result['yearly_current']:,.2f}** on **{habit_label}** now → "
-        f"**${result['yearly_alternative']:,.2f}** with alternative → **Save ${result['yearly_savings']:,.2f}/year**."
+            worked = False
+            for model in _MODELS:
+                with st.spinner(f"Trying {model}..."):
+                    try:
+                        runner = _get_runner(key)
+                        test = runner.run(input="Reply with exactly: OK", model=model)
+                        future = asyncio.run_coroutine_threadsafe(test, _get_loop())
+                        try:
+                            r = future.result(timeout=AI_CHUNK_TIMEOUT_S)
+                        except TimeoutError:
+                            future.cancel()
+                            raise
+                        out = r.final_output or ""
+                        st.success(f"Dedalus is working (model: {model}). Response: {out[:200]}")
+                        worked = True
+                        break
+                    except d.InternalServerError:
+                        continue
+                    except TimeoutError:
+                        st.error(f"Dedalus test timed out after {AI_CHUNK_TIMEOUT_S} s (model: {model}). Please try again.")
+                        worked = True
+                        break
+                    except Exception as e:
+                        st.error(f"Dedalus test failed: {e}")
+                        worked = True
+                        break
+            if not worked:
+                st.error(
+                    "Dedalus returned 500 for all models. This is a server-side issue. "
+                    "Try again in a few minutes or contact support@dedaluslabs.ai."
+                )
+    st.caption(
+        'e.g. "How much would I save if I quit Starbucks?" or "When can I afford a car?"'
     )
-    st.divider()
 
-# ---------------------------------------------------------------------------
-# Section: GOAL (Sort by Goals)
-# ---------------------------------------------------------------------------
-if False:  # moved to dialog_goal()
-    st.header("GOAL")
-    st.caption("Sort by goals. Set target amounts in the sidebar. ETAs use your current savings and monthly savings.")
-    # Sort by Goals: dropdown to order goals (by ETA soonest, by target amount, or default order)
-    sort_option = st.selectbox(
-        "Sort by",
-        ["Default (Home, Car, Vacation, School)", "Soonest ETA first", "Target amount (low → high)", "Target amount (high → low)"],
-        key="goal_sort",
-    )
-    # Build list of (goal_name, target, eta_result) and sort if needed
-    current = st.session_state.current_savings
-    goals_data = []
-    for goal_name in GOAL_CATEGORIES:
-        target = st.session_state.goals.get(goal_name, 0)
-        eta_result = goal_eta(
-            goal_amount=target,
-            current_savings=current,
-            monthly_savings=monthly_savings,
-            goal_name=goal_name,
+    for msg in st.session_state.messages:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
+    # st.bottom keeps the input pinned below the page; from inside the fragment, chat_input
+    # would otherwise render inline, above the new turn drawn below.
+    with st.bottom:
+        prompt = st.chat_input("Ask about your budget, goals, or paper cuts...")
+    if prompt:
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # Context string for the AI (so it can call tools with current data); only built on submit.
+        # Read from session state: this fragment can rerun without the rest of the script.
+        income_f = float(st.session_state.income)
+        expenses_f = float(st.session_state.expenses)
+        budget_context = _format_ctx(
+            income_f,
+            expenses_f,
+            _cached_monthly_savings(income_f, expenses_f),
+            float(st.session_state.current_savings),
+            tuple(st.session_state.goals.items()),
         )
-        goals_data.append((goal_name, target, eta_result))
-    if "Soonest ETA first" in sort_option:
-        def eta_months(item):
-            name, target, eta = item
-            m = eta.get("months_needed")
-            return m if m is not None else float("inf")
-        goals_data.sort(key=eta_months)
-    elif "Target amount (low → high)" in sort_option:
-        goals_data.sort(key=lambda x: x[1])
-    elif "Target amount (high → low)" in sort_option:
-        goals_data.sort(key=lambda x: x[1], reverse=True)
-    # Render goal cards with progress bars
-    goal_cols = st.columns(len(goals_data))
-    for i, (goal_name, target, eta_result) in enumerate(goals_data):
-        with goal_cols[i]:
-            st.subheader(goal_name)
-            st.write(f"Target: **${target:,.0f}**")
-            if target > 0:
-                progress_pct = min(100.0, (current / target) * 100.0)
-                st.progress(progress_pct / 100.0)
-                st.caption(f"{progress_pct:.0f}% of goal · ${max(0, target - current):,.0f} to go")
-            st.write(eta_result["message"])
-            if eta_result.get("eta_date"):
-                st.caption(f"ETA: ~{eta_result['eta_date']}")
-            elif not eta_result.get("reachable", True) or eta_result.get("months_needed") is None:
-                st.caption("Increase monthly savings to see an ETA.")
-    st.divider()
+        with st.chat_message("assistant"):
+            reply = st.write_stream(run_ai_assistant(prompt, budget_context))
+        st.session_state.messages.append({"role": "assistant", "content": reply})
 
 
-# ---------------------------------------------------------------------------
-# AI Assistant (Dedalus Tool Calling) — always visible at bottom
-# ---------------------------------------------------------------------------
-st.header("AI Assistant")
-api_key = _get_dedalus_api_key()
-dedalus_key_set = bool(api_key)
-if dedalus_key_set:
-    st.caption("Dedalus: API key set. Ask about savings or goals (Tool Calling: Paper Cut & Goal ETA).")
-else:
-    st.warning("Dedalus: API key not set. Add `DEDALUS_API_KEY` to your `.env` in the project folder and restart the app.")
-    with st.expander("Where the app looks for .env"):
-        st.code(f"1. {_app_dir / '.env'}\n2. {Path.cwd() / '.env'}", language="text")
-        st.caption("Ensure .env is in the same folder as app.py and contains: DEDALUS_API_KEY=your_key")
-if st.button("Verify Dedalus key", key="verify_dedalus"):
-    key = _get_dedalus_api_key()
-    if not key:
-        st.error("Key not found. Check that .env exists next to app.py and has DEDALUS_API_KEY=... (no quotes)")
-    else:
-        from dedalus_labs import AsyncDedalus, DedalusRunner
-        from dedalus_labs import InternalServerError
-        models = ["anthropic/claude-opus-4-6", "anthropic/claude-sonnet-4", "anthropic/claude-3-5-sonnet-latest"]
-        worked = False
-        for model in models:
-            with st.spinner(f"Trying {model}..."):
-                try:
-                    async def _test(m):
-                        client = AsyncDedalus(api_key=key)
-                        runner = DedalusRunner(client)
-                        r = await runner.run(input="Reply with exactly: OK", model=m)
-                        return r.final_output or ""
-                    out = asyncio.run(_test(model))
-                    st.success(f"Dedalus is working (model: {model}). Response: {out[:200]}")
-                    worked = True
-                    break
-                except InternalServerError:
-                    continue
-                except Exception as e:
-                    st.error(f"Dedalus test failed: {e}")
-                    worked = True
-                    break
-        if not worked:
-            st.error(
-                "Dedalus returned 500 for all models. This is a server-side issue. "
-                "Try again in a few minutes or contact support@dedaluslabs.ai."
-            )
-st.caption(
-    'e.g. "How much would I save if I quit Starbucks?" or "When can I afford a car?"'
-)
-
-# Chat history
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
-
-if prompt := st.chat_input("Ask about your budget, goals, or paper cuts..."):
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            reply = run_ai_assistant(prompt, budget_context)
-        st.markdown(reply)
-    st.session_state.messages.append({"role": "assistant", "content": reply})
+_ai_assistant_fragment()
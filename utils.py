@@ -3,7 +3,25 @@ PIN PLAN - Financial planning utilities and Dedalus tools.
 All functions are designed for use in the Streamlit UI and as Dedalus Runner tools.
 """
 
-from datetime import datetime, timedelta
+import math
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the numeric kernels then run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+
+# Calendar constants shared by the Paper Cut and Goal ETA math (module-level, so the JIT
+# kernels bake them in as literals)
+WEEKS_PER_YEAR = 52.0
+DAYS_PER_MONTH = 30.44
 
 
 # ---------------------------------------------------------------------------
@@ -15,7 +33,7 @@ def calculate_monthly_savings(income: float, expenses: float) -> float:
     Compute monthly savings from income and total expenses.
     Used by the budget dashboard and by the AI when answering savings questions.
     """
-    return max(0.0, float(income) - float(expenses))
+    return _monthly_savings_core(float(income), float(expenses))
 
 
 def paper_cut_yearly_impact(
@@ -33,21 +51,63 @@ def paper_cut_yearly_impact(
 
     Returns a dict with: yearly_current, yearly_alternative, yearly_savings, description.
     """
-    current = float(current_expense)
-    alternative = float(alternative_expense)
-    freq = max(0.0, float(frequency_per_week))
-    weeks_per_year = 52.0
-    yearly_current = current * freq * weeks_per_year
-    yearly_alternative = alternative * freq * weeks_per_year
-    yearly_savings = yearly_current - yearly_alternative
+    yearly_current, yearly_alternative = _paper_cut_core(
+        float(current_expense), float(alternative_expense), max(0.0, float(frequency_per_week))
+    )
+    return paper_cut_result(yearly_current, yearly_alternative, description)
+
+
+def paper_cut_result(yearly_current: float, yearly_alternative: float, description: str = "") -> dict:
+    """
+    Shape unrounded yearly costs into the paper_cut_yearly_impact dict. Also used by the
+    Paper Cut dialog's daily mode, so both modes round the same way.
+    """
+    # Round the yearly figures (not the unit price) to integer cents: savings are an exact
+    # difference and dollars only appear in the dict
+    current_cents = _to_cents(yearly_current)
+    alternative_cents = _to_cents(yearly_alternative)
     return {
-        "yearly_current": round(yearly_current, 2),
-        "yearly_alternative": round(yearly_alternative, 2),
-        "yearly_savings": round(yearly_savings, 2),
+        "yearly_current": _from_cents(current_cents),
+        "yearly_alternative": _from_cents(alternative_cents),
+        "yearly_savings": _from_cents(current_cents - alternative_cents),
         "description": description or "Paper cut expense vs alternative",
     }
 
 
+def paper_cut_yearly_impact_batch(
+    current_expenses,
+    alternative_expenses,
+    frequencies_per_week,
+    descriptions=None,
+) -> dict:
+    """
+    Vectorized paper_cut_yearly_impact for several habits at once (coffee, subscriptions,
+    lunches, ...). Yearly figures for all scenarios are computed in one NumPy pass.
+
+    Returns a dict of arrays: yearly_current, yearly_alternative, yearly_savings, plus a
+    description list, each in input order. Figures match paper_cut_yearly_impact exactly.
+    Raises ValueError if descriptions doesn't have one entry per scenario.
+    """
+    current = np.asarray(current_expenses, dtype=np.float64)
+    alternative = np.asarray(alternative_expenses, dtype=np.float64)
+    annual_freq = np.maximum(np.asarray(frequencies_per_week, dtype=np.float64), 0.0) * WEEKS_PER_YEAR
+    yearly_current = current * annual_freq
+    yearly_alternative = alternative * annual_freq
+    n = np.broadcast(yearly_current, yearly_alternative).size
+    descriptions = list(descriptions) if descriptions is not None else [""] * n
+    if len(descriptions) != n:
+        raise ValueError(f"Expected {n} descriptions (one per scenario), got {len(descriptions)}")
+    # Same cents rounding as the scalar function, so both return identical figures
+    current_cents = _to_cents_array(yearly_current)
+    alternative_cents = _to_cents_array(yearly_alternative)
+    return {
+        "yearly_current": _from_cents(current_cents),
+        "yearly_alternative": _from_cents(alternative_cents),
+        "yearly_savings": _from_cents(current_cents - alternative_cents),
+        "description": [d or "Paper cut expense vs alternative" for d in descriptions],
+    }
+
+
 def goal_eta(
     goal_amount: float,
     current_savings: float,
@@ -63,33 +123,144 @@ def goal_eta(
     goal = max(0.0, float(goal_amount))
     current = max(0.0, float(current_savings))
     monthly = float(monthly_savings)
+    months_needed, reachable = _goal_eta_core(goal, current, monthly)
+    if not reachable:
+        return _goal_eta_result(goal_name, monthly, None, None)
+    if months_needed == 0:
+        return _goal_eta_result(goal_name, monthly, 0.0, None)
+    return _goal_eta_result(goal_name, monthly, months_needed, datetime.now().date())
+
+
+def goal_eta_batch(
+    goals,
+    current_savings,
+    monthly_savings,
+    goal_names=None,
+    today: date | None = None,
+) -> dict:
+    """
+    Vectorized goal_eta over arrays of goal amounts, current savings and monthly savings
+    (scalars broadcast). Months-to-goal, reachability and ETA day ordinals are computed in
+    one NumPy pass; ISO dates are built only for goals with a future ETA.
+
+    Returns a dict of arrays: months_needed (0 = reached, inf = unreachable), reachable and
+    eta_ordinal (-1 = no future ETA), plus eta_date and message lists, in input order.
+    Raises ValueError if goal_names doesn't have one entry per goal.
+    """
+    goals, current, monthly = np.broadcast_arrays(
+        np.maximum(np.asarray(goals, dtype=np.float64), 0.0),
+        np.maximum(np.asarray(current_savings, dtype=np.float64), 0.0),
+        np.asarray(monthly_savings, dtype=np.float64),
+    )
+    remaining = np.maximum(goals - current, 0.0)
+    reached = remaining <= 0
+    saving = monthly > 0
+    months = np.divide(remaining, monthly, out=np.full_like(remaining, np.inf), where=saving & ~reached)
+    months[reached] = 0.0
+    reachable = reached | saving
+    pending = saving & ~reached
+    today_ord = (today or datetime.now().date()).toordinal()
+    eta_ordinal = np.full(months.shape, -1, dtype=np.int64)
+    eta_ordinal[pending] = today_ord + (months[pending] * DAYS_PER_MONTH).astype(np.int64)
+    names = list(goal_names) if goal_names is not None else ["Goal"] * months.size
+    if len(names) != months.size:
+        raise ValueError(f"Expected {months.size} goal names (one per goal), got {len(names)}")
+    month_list = months.ravel().tolist()
+    monthly_list = monthly.ravel().tolist()
+    return {
+        "months_needed": months,
+        "reachable": reachable,
+        "eta_ordinal": eta_ordinal,
+        "eta_date": [date.fromordinal(o).isoformat() if o >= 0 else None for o in eta_ordinal.ravel().tolist()],
+        "message": [
+            _goal_eta_message(name, m, None if n == np.inf else n)
+            for name, m, n in zip(names, monthly_list, month_list, strict=True)
+        ],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Numeric kernels (JIT-compiled when numba is installed; cache=True persists the
+# compiled code on disk so Streamlit restarts don't pay the compile again). Each is
+# memoized on its float args and returns an immutable float or tuple, so repeated tool
+# calls with the same numbers (the model re-checking its math) skip the kernel entirely.
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=512)
+@njit(cache=True, fastmath=True)
+def _monthly_savings_core(income, expenses):
+    """Income minus expenses, floored at zero."""
+    return max(0.0, income - expenses)
+
+
+# No fastmath here: the products must match paper_cut_yearly_impact_batch bit for bit,
+# so both paths round to the same cents.
+@lru_cache(maxsize=512)
+@njit(cache=True)
+def _paper_cut_core(current, alternative, freq):
+    """Unrounded yearly current and alternative cost for a per-occurrence cost at freq/week."""
+    annual_freq = freq * WEEKS_PER_YEAR
+    return current * annual_freq, alternative * annual_freq
+
+
+# Signature-pinned: compiled eagerly at import instead of on the first goal_eta call.
+@lru_cache(maxsize=512)
+@njit("Tuple((float64, int8))(float64, float64, float64)", cache=True, fastmath=True)
+def _goal_eta_core(goal, current, monthly):
+    """(months until goal, reachable flag): (0.0, 1) if already reached, (-1.0, 0) if unreachable."""
     remaining = goal - current
     if remaining <= 0:
-        return {
-            "months_needed": 0,
-            "reachable": True,
-            "message": f"You have already reached or exceeded the {goal_name} target.",
-            "eta_date": None,
-        }
+        return 0.0, np.int8(1)
     if monthly <= 0:
-        return {
-            "months_needed": None,
-            "reachable": False,
-            "message": f"Cannot reach {goal_name} with current monthly savings (${monthly:,.2f}). Increase income or reduce expenses.",
-            "eta_date": None,
-        }
-    months_needed = remaining / monthly
-    today = datetime.now().date()
-    eta_date = (today + timedelta(days=int(months_needed * 30.44))).isoformat()
-    return {
-        "months_needed": round(months_needed, 1),
-        "reachable": True,
-        "message": f"At ${monthly:,.2f}/month savings, you'll reach {goal_name} in ~{months_needed:.1f} months.",
-        "eta_date": eta_date,
-    }
+        return -1.0, np.int8(0)
+    return remaining / monthly, np.int8(1)
+
+
+def _to_cents(x: float):
+    """
+    Dollars to whole cents, rounding half up (floor, so negative amounts round correctly too).
+    Non-finite results (inf/nan input, or overflow) pass through as floats instead of raising.
+    """
+    scaled = x * 100.0 + 0.5
+    return math.floor(scaled) if math.isfinite(scaled) else scaled
+
+
+def _to_cents_array(x: np.ndarray) -> np.ndarray:
+    """
+    Vectorized _to_cents (same expression, so identical rounding). Cents stay float64 (whole
+    numbers, exact below 2**53) so inf/nan pass through instead of wrapping in an int cast.
+    """
+    scaled = x * 100.0 + 0.5
+    return np.where(np.isfinite(scaled), np.floor(scaled), scaled)
+
+
+def _from_cents(c):
+    """Whole cents (int, float or array) back to dollars, only at the dict boundary."""
+    return c / 100.0
+
+
+def _goal_eta_message(goal_name: str, monthly: float, months_needed) -> str:
+    """goal_eta message text: 0 months = already reached, None = unreachable."""
+    if months_needed is None:
+        return f"Cannot reach {goal_name} with current monthly savings (${monthly:,.2f}). Increase income or reduce expenses."
+    if months_needed <= 0:
+        return f"You have already reached or exceeded the {goal_name} target."
+    return f"At ${monthly:,.2f}/month savings, you'll reach {goal_name} in ~{months_needed:.1f} months."
+
+
+def _goal_eta_result(goal_name: str, monthly: float, months_needed, today) -> dict:
+    """Shape the goal_eta dict: 0 months = already reached, None = unreachable."""
+    message = _goal_eta_message(goal_name, monthly, months_needed)
+    if months_needed is None:
+        return {"months_needed": None, "reachable": False, "message": message, "eta_date": None}
+    if months_needed <= 0:
+        return {"months_needed": 0, "reachable": True, "message": message, "eta_date": None}
+    eta_date = date.fromordinal(today.toordinal() + int(months_needed * DAYS_PER_MONTH)).isoformat()
+    return {"months_needed": round(months_needed, 1), "reachable": True, "message": message, "eta_date": eta_date}
 
 
 # ---------------------------------------------------------------------------
 # Goal categories for the Goal Tracker (Sort by Goals)
 # ---------------------------------------------------------------------------
-GOAL_CATEGORIES = ["Home", "Car", "Vacation", "School"]
+GOAL_CATEGORIES = ("Home", "Car", "Vacation", "School")  # display order
+GOAL_CATEGORIES_SET = frozenset(GOAL_CATEGORIES)  # O(1) membership checks